@@ -0,0 +1,356 @@
+"""
+Packed binary archive of the APOD image cache.
+
+Description:
+  Exports the whole image cache (image files and DB records) to a single
+  packed archive file, and imports such an archive into the image cache.
+  Seeding a new machine from an archive is a single sequential read.
+
+Archive layout (all integers little-endian):
+  - Header: magic, entry count, metadata length
+  - Index: one fixed-size record per image (id, date, sha256, offset, length)
+  - Metadata: UTF-8 JSON list of {title, explanation, file_name}, in index order
+  - Blobs: the image files, concatenated in index order
+
+  The APOD date is only recorded for images added to the cache after the DB
+  gained its apod_date column. Older records are exported without a date and
+  can only be looked up in an archive by SHA-256 hash.
+
+Usage:
+  python apod_archive.py export archive_path
+  python apod_archive.py import archive_path
+"""
+import os
+import sys
+import mmap
+import json
+import ntpath
+import struct
+import hashlib
+import sqlite3
+import apod_desktop
+
+ARCHIVE_MAGIC = b'APODPAK1'
+HEADER_FORMAT = '<8sIQ'
+INDEX_FORMAT = '<I10s32sQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ('export', 'import'):
+        print("Usage: python apod_archive.py export|import archive_path")
+        sys.exit(1)
+
+    command, archive_path = sys.argv[1], sys.argv[2]
+    try:
+        apod_desktop.init_apod_cache()
+        if command == 'export':
+            count = export_apod_archive(archive_path)
+            print(f"Exported {count} APOD image(s) to {archive_path}")
+        else:
+            count = import_apod_archive(archive_path)
+            print(f"Imported {count} APOD image(s) from {archive_path}")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+def export_apod_archive(archive_path):
+    """Exports all APODs in the image cache to a packed archive file.
+
+    Args:
+        archive_path (str): Path of the archive file to create
+
+    Returns:
+        int: Number of APOD images written to the archive
+    """
+    archive_dir = os.path.dirname(os.path.abspath(archive_path))
+    if not os.path.isdir(archive_dir):
+        raise FileNotFoundError(f"Directory {archive_dir} does not exist")
+
+    conn = sqlite3.connect(apod_desktop.image_cache_db)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id, apod_date, sha256, title, explanation, file_path FROM apod_images
+            ORDER BY apod_date, id
+        """)
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    # Skip records whose image file is missing from the cache
+    entries = []
+    for apod_id, apod_date, sha256, title, explanation, file_path in rows:
+        file_path = _find_cache_file(file_path)
+        if file_path is None:
+            print(f"Warning: Image file for APOD {apod_id} is missing, skipping")
+            continue
+        entries.append((apod_id, apod_date, sha256, title, explanation, file_path,
+                        os.path.getsize(file_path)))
+
+    undated_count = sum(1 for entry in entries if not entry[1])
+    if undated_count:
+        print(f"Warning: {undated_count} APOD(s) have no date and can only be looked up by SHA-256")
+
+    metadata = json.dumps([
+        {'title': title, 'explanation': explanation, 'file_name': os.path.basename(file_path)}
+        for _, _, _, title, explanation, file_path, _ in entries
+    ]).encode('utf-8')
+
+    # Blobs start right after the header, index and metadata
+    offset = HEADER_SIZE + INDEX_SIZE * len(entries) + len(metadata)
+    index = []
+    for apod_id, apod_date, sha256, _, _, _, length in entries:
+        index.append(struct.pack(INDEX_FORMAT, apod_id, (apod_date or '').encode('ascii'),
+                                 bytes.fromhex(sha256), offset, length))
+        offset += length
+
+    # Write to a temporary file so a failed export never leaves a partial archive behind.
+    # Each image is hashed while it is copied, so it is only read once.
+    temp_path = archive_path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as archive:
+            archive.write(struct.pack(HEADER_FORMAT, ARCHIVE_MAGIC, len(entries), len(metadata)))
+            archive.write(b''.join(index))
+            archive.write(metadata)
+            for _, _, sha256, _, _, file_path, length in entries:
+                with open(file_path, 'rb') as image_file:
+                    copied_sha256, copied_length = _copy_stream(image_file, archive)
+                if copied_length != length:
+                    raise ValueError(f"Image file {file_path} changed during export")
+                if copied_sha256 != sha256:
+                    raise ValueError(f"Image file {file_path} does not match its SHA-256 in the DB")
+        os.replace(temp_path, archive_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return len(entries)
+
+
+def import_apod_archive(archive_path):
+    """Imports all APODs from a packed archive file into the image cache.
+
+    The archive is read sequentially, streaming each image into a temporary
+    file in the image cache directory that is renamed into place once its
+    SHA-256 hash is verified. All DB records are added in a single transaction;
+    if anything fails, the transaction is rolled back and the image files
+    created so far are removed. APODs already in the cache are skipped. If an
+    image file is already on disk without a DB record (e.g. after an interrupted
+    import), its record is added when the file matches the archived image;
+    otherwise it is skipped.
+
+    Args:
+        archive_path (str): Path of the archive file
+
+    Returns:
+        int: Number of APOD images added to the image cache
+    """
+    imported_count = 0
+    written_paths = []
+    temp_path = None
+    conn = sqlite3.connect(apod_desktop.image_cache_db)
+    cursor = conn.cursor()
+    try:
+        with open(archive_path, 'rb') as archive:
+            entry_count, metadata_length = _unpack_header(archive.read(HEADER_SIZE))
+            index = _unpack_index(archive.read(INDEX_SIZE * entry_count), entry_count)
+            metadata = json.loads(archive.read(metadata_length).decode('utf-8'))
+            if not isinstance(metadata, list) or len(metadata) != entry_count:
+                raise ValueError("Corrupt APOD archive metadata")
+            _check_index(index, entry_count, metadata_length, os.fstat(archive.fileno()).st_size)
+
+            for entry, info in zip(index, metadata):
+                file_path = _import_file_path(info['file_name'])
+                cursor.execute("SELECT 1 FROM apod_images WHERE sha256 = ? OR file_path = ?",
+                               (entry['sha256'], file_path))
+                if cursor.fetchone():
+                    continue
+                if os.path.exists(file_path):
+                    if _hash_file(file_path) != (entry['sha256'], entry['length']):
+                        print(f"Warning: {file_path} already exists with different contents, skipping")
+                        continue
+                else:
+                    # A .part file left over from an interrupted import is simply overwritten
+                    archive.seek(entry['offset'])
+                    temp_path = file_path + '.part'
+                    with open(temp_path, 'wb') as image_file:
+                        sha256, _ = _copy_stream(archive, image_file, entry['length'])
+                    if sha256 != entry['sha256']:
+                        raise ValueError(f"SHA-256 mismatch for {info['file_name']}")
+                    os.replace(temp_path, file_path)
+                    temp_path = None
+                    written_paths.append(file_path)
+
+                cursor.execute("""
+                    INSERT INTO apod_images (title, explanation, file_path, sha256, apod_date)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (info['title'], info['explanation'], file_path, entry['sha256'], entry['date']))
+                imported_count += 1
+
+        conn.commit()
+        return imported_count
+    except Exception:
+        conn.rollback()
+        for file_path in written_paths + ([temp_path] if temp_path else []):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        raise
+    finally:
+        conn.close()
+
+
+class ApodArchive:
+    """Read-only, memory-mapped view of a packed APOD archive.
+
+    Images can be looked up at random by APOD date or SHA-256 hash
+    without reading the rest of the archive.
+    """
+
+    def __init__(self, archive_path):
+        self._file = open(archive_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            entry_count, metadata_length = _unpack_header(self._mmap[:HEADER_SIZE])
+            self.entries = _unpack_index(self._mmap[HEADER_SIZE:HEADER_SIZE + INDEX_SIZE * entry_count],
+                                         entry_count)
+            _check_index(self.entries, entry_count, metadata_length, len(self._mmap))
+        except Exception:
+            self.close()
+            raise
+        self._by_date = {entry['date']: entry for entry in self.entries if entry['date']}
+        self._by_sha256 = {entry['sha256']: entry for entry in self.entries}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def get_image_by_date(self, apod_date):
+        """Gets the image data of the APOD from a specified date.
+
+        Args:
+            apod_date (date): APOD date (Can also be a string formatted as YYYY-MM-DD)
+
+        Returns:
+            bytes: Binary image data, if the APOD is in the archive. None, if it is not.
+        """
+        if not isinstance(apod_date, str):
+            apod_date = apod_date.isoformat()
+        return self._read_blob(self._by_date.get(apod_date))
+
+    def get_image_by_sha256(self, image_sha256):
+        """Gets the image data of the APOD having a specified SHA-256 hash value.
+
+        Args:
+            image_sha256 (str): SHA-256 hash value of APOD image
+
+        Returns:
+            bytes: Binary image data, if the APOD is in the archive. None, if it is not.
+        """
+        return self._read_blob(self._by_sha256.get(image_sha256.lower()))
+
+    def _read_blob(self, entry):
+        if entry is None:
+            return None
+        return self._mmap[entry['offset']:entry['offset'] + entry['length']]
+
+
+def _unpack_header(header):
+    if len(header) != HEADER_SIZE:
+        raise ValueError("Truncated APOD archive header")
+    magic, entry_count, metadata_length = struct.unpack(HEADER_FORMAT, header)
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError("Not an APOD archive")
+    return entry_count, metadata_length
+
+
+def _unpack_index(index_data, entry_count):
+    if len(index_data) != INDEX_SIZE * entry_count:
+        raise ValueError("Truncated APOD archive index")
+    return [
+        {
+            'id': apod_id,
+            'date': apod_date.rstrip(b'\0').decode('ascii') or None,
+            'sha256': sha256.hex(),
+            'offset': offset,
+            'length': length,
+        }
+        for apod_id, apod_date, sha256, offset, length in struct.iter_unpack(INDEX_FORMAT, index_data)
+    ]
+
+
+def _check_index(index, entry_count, metadata_length, archive_size):
+    data_start = HEADER_SIZE + INDEX_SIZE * entry_count + metadata_length
+    for entry in index:
+        if entry['offset'] < data_start or entry['offset'] + entry['length'] > archive_size:
+            raise ValueError(f"Corrupt APOD archive index entry for APOD {entry['id']}")
+
+
+def _find_cache_file(file_path):
+    """Gets the path of an image file recorded in the DB, falling back to the
+    image cache directory when the stored path does not exist (e.g. a DB
+    created on another machine). Returns None if neither exists."""
+    if os.path.isfile(file_path):
+        return file_path
+    # ntpath.basename also handles Windows paths stored in the DB
+    cache_path = os.path.join(apod_desktop.image_cache_dir, ntpath.basename(file_path))
+    return cache_path if os.path.isfile(cache_path) else None
+
+
+def _import_file_path(file_name):
+    """Gets the image cache path for a file name read from an archive,
+    rejecting any name that could point outside the image cache directory."""
+    if (not isinstance(file_name, str) or file_name in ('', '.', '..')
+            or file_name != os.path.basename(file_name) or file_name != ntpath.basename(file_name)):
+        raise ValueError(f"Invalid file name in APOD archive: {file_name!r}")
+    cache_dir = os.path.realpath(apod_desktop.image_cache_dir)
+    file_path = os.path.join(apod_desktop.image_cache_dir, file_name)
+    if os.path.dirname(os.path.realpath(file_path)) != cache_dir:
+        raise ValueError(f"Invalid file name in APOD archive: {file_name!r}")
+    return file_path
+
+
+def _hash_file(file_path):
+    """Gets the SHA-256 hash value and length of a file."""
+    with open(file_path, 'rb') as f:
+        sha256 = hashlib.sha256()
+        length = 0
+        while chunk := f.read(COPY_CHUNK_SIZE):
+            sha256.update(chunk)
+            length += len(chunk)
+    return sha256.hexdigest(), length
+
+
+def _copy_stream(source, destination, length=None):
+    """Copies data from one file object to another, returning the SHA-256
+    hash value and length of the data copied. If a length is given, exactly
+    that many bytes are copied."""
+    sha256 = hashlib.sha256()
+    copied = 0
+    while length is None or copied < length:
+        chunk_size = COPY_CHUNK_SIZE if length is None else min(length - copied, COPY_CHUNK_SIZE)
+        chunk = source.read(chunk_size)
+        if not chunk:
+            if length is not None:
+                raise ValueError("Truncated APOD archive data")
+            break
+        sha256.update(chunk)
+        destination.write(chunk)
+        copied += len(chunk)
+    return sha256.hexdigest(), copied
+
+
+if __name__ == '__main__':
+    main()
@@ -100,9 +100,16 @@ def init_apod_cache():
             title TEXT NOT NULL,
             explanation TEXT NOT NULL,
             file_path TEXT NOT NULL UNIQUE,
-            sha256 TEXT NOT NULL UNIQUE
+            sha256 TEXT NOT NULL UNIQUE,
+            apod_date TEXT
         )
     """)
+
+    # Add the APOD date column to databases created before it existed
+    cursor.execute("PRAGMA table_info(apod_images)")
+    column_names = [row[1] for row in cursor.fetchall()]
+    if 'apod_date' not in column_names:
+        cursor.execute("ALTER TABLE apod_images ADD COLUMN apod_date TEXT")
     conn.commit()
     conn.close()
 
@@ -158,7 +165,8 @@ def add_apod_to_cache(apod_date):
         return 0
 
     # Add the APOD information to the DB
-    apod_id = add_apod_to_db(apod_info['title'], apod_info['explanation'], file_path, sha256)
+    apod_id = add_apod_to_db(apod_info['title'], apod_info['explanation'], file_path, sha256,
+                             apod_date.isoformat())
     if apod_id != 0:
         print("Adding APOD to image cache DB...success")
     else:
@@ -167,7 +175,7 @@ def add_apod_to_cache(apod_date):
     return apod_id
 
 
-def add_apod_to_db(title, explanation, file_path, sha256):
+def add_apod_to_db(title, explanation, file_path, sha256, apod_date=None):
     """Adds specified APOD information to the image cache DB.
      
     Args:
@@ -175,6 +183,7 @@ def add_apod_to_db(title, explanation, file_path, sha256):
         explanation (str): Explanation of the APOD image
         file_path (str): Full path of the APOD image file
         sha256 (str): SHA-256 hash value of APOD image
+        apod_date (str, optional): APOD date (format: YYYY-MM-DD). Defaults to None.
 
     Returns:
         int: The ID of the newly inserted APOD record, if successful. Zero, if unsuccessful       
@@ -183,9 +192,9 @@ def add_apod_to_db(title, explanation, file_path, sha256):
     cursor = conn.cursor()
     try:
         cursor.execute("""
-            INSERT INTO apod_images (title, explanation, file_path, sha256)
-            VALUES (?, ?, ?, ?)
-        """, (title, explanation, file_path, sha256))
+            INSERT INTO apod_images (title, explanation, file_path, sha256, apod_date)
+            VALUES (?, ?, ?, ?, ?)
+        """, (title, explanation, file_path, sha256, apod_date))
         conn.commit()
         return cursor.lastrowid
     except sqlite3.IntegrityError: